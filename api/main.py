@@ -3,26 +3,31 @@
 FastAPI backend for Faceless Video Automation Tool
 """
 
+import asyncio
+import io
 import os
 import sys
-import shutil
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from urllib.parse import quote, urlencode
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
 from pydantic import BaseModel
 import zipfile
-import tempfile
 
 # Add the stable-diffusion scripts to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'stable-diffusion', 'scripts'))
 
 try:
-    from generate_listicle import generate_listicle_images
+    from generate_listicle import generate_listicle_images, topic_slug
 except ImportError as e:
     print(f"Warning: Could not import generate_listicle: {e}")
     generate_listicle_images = None
+    topic_slug = None
 
 app = FastAPI(
     title="Faceless Video Automation API",
@@ -33,16 +38,37 @@ app = FastAPI(
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "*"],
+    allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$",
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
-# Serve static files (generated images)
+# Limit concurrent generations; all requests share one Stable Diffusion pipeline
+generation_semaphore = asyncio.Semaphore(int(os.getenv("FVAT_CONCURRENCY", "1")))
+
+# Serve static files (generated images). Set FVAT_SERVE_OUTPUTS=0 when a
+# front proxy such as nginx serves the outputs directory directly.
 outputs_dir = os.path.join(os.path.dirname(__file__), '..', 'stable-diffusion', 'outputs')
-if os.path.exists(outputs_dir):
-    app.mount("/outputs", StaticFiles(directory=outputs_dir), name="outputs")
+serve_outputs = os.getenv("FVAT_SERVE_OUTPUTS", "1") != "0"
+# Generated files are timestamped and never change, so browsers may cache them
+OUTPUT_CACHE_CONTROL = "public, max-age=3600"
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with a Cache-Control header on top of its ETag/Last-Modified"""
+    
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", OUTPUT_CACHE_CONTROL)
+        return response
+
+if serve_outputs and os.path.exists(outputs_dir):
+    app.mount("/outputs", CachedStaticFiles(directory=outputs_dir), name="outputs")
+
+@app.on_event("startup")
+async def init_cache():
+    """Set up the in-memory response cache"""
+    FastAPICache.init(InMemoryBackend(), prefix="fvat")
 
 # Request/Response models
 class ListicleRequest(BaseModel):
@@ -50,6 +76,7 @@ class ListicleRequest(BaseModel):
     format_type: str = "landscape"  # landscape or portrait
     background_type: str = "color"  # color, ai, or stock
     num_slides: int = 5
+    image_format: str = "png"  # png or webp
 
 class ListicleResponse(BaseModel):
     success: bool
@@ -63,6 +90,7 @@ async def root():
     return {"message": "Faceless Video Automation API is running"}
 
 @app.get("/formats")
+@cache(expire=3600)
 async def get_formats():
     """Get available format options"""
     return {
@@ -84,6 +112,10 @@ async def get_formats():
             "color": "Solid color gradients",
             "ai": "AI-generated images (requires model download)",
             "stock": "Stock images from Unsplash"
+        },
+        "image_formats": {
+            "png": "Lossless PNG",
+            "webp": "Smaller lossy WebP"
         }
     }
 
@@ -100,6 +132,7 @@ async def generate_listicle(request: ListicleRequest):
     # Validate inputs
     valid_formats = ["landscape", "portrait"]
     valid_backgrounds = ["color", "ai", "stock"]
+    valid_image_formats = ["png", "webp"]
     
     if request.format_type not in valid_formats:
         raise HTTPException(
@@ -113,6 +146,12 @@ async def generate_listicle(request: ListicleRequest):
             detail=f"Invalid background type. Must be one of: {valid_backgrounds}"
         )
     
+    if request.image_format not in valid_image_formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid image format. Must be one of: {valid_image_formats}"
+        )
+    
     if not request.topic.strip():
         raise HTTPException(
             status_code=400,
@@ -127,13 +166,16 @@ async def generate_listicle(request: ListicleRequest):
     
     try:
         print(f"Generating listicle: {request.topic}, {request.format_type}, {request.background_type}")
-        # Generate the listicle
-        image_paths = generate_listicle_images(
-            topic=request.topic,
-            format_type=request.format_type,
-            background_type=request.background_type,
-            num_slides=request.num_slides
-        )
+        # Generate the listicle in a worker thread so the event loop stays free
+        async with generation_semaphore:
+            image_paths = await asyncio.to_thread(
+                generate_listicle_images,
+                topic=request.topic,
+                format_type=request.format_type,
+                background_type=request.background_type,
+                num_slides=request.num_slides,
+                image_format=request.image_format
+            )
         print(f"Generated paths: {image_paths}")
         
         # Convert paths to proper URLs
@@ -170,32 +212,99 @@ async def generate_listicle(request: ListicleRequest):
         )
 
 def create_download_zip(image_paths: List[str], topic: str, format_type: str) -> str:
-    """Create a ZIP file with all generated images"""
+    """Build the URL that streams a ZIP of all generated images"""
+    
+    query = urlencode({
+        "topic": topic,
+        "format_type": format_type,
+        "files": [os.path.basename(image_path) for image_path in image_paths]
+    }, doseq=True)
+    
+    return f"/download?{query}"
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Non-seekable write buffer that hands ZIP bytes off as they are produced"""
+    
+    def __init__(self):
+        self._buffer = bytearray()
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._buffer.extend(data)
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def iter_zip(file_paths: List[str]):
+    """Yield a stored (uncompressed) ZIP archive of file_paths one file at a time"""
+    
+    buffer = ZipStreamBuffer()
+    
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zipf:
+        for file_path in file_paths:
+            # Add file to ZIP with just the filename
+            zipf.write(file_path, os.path.basename(file_path))
+            yield buffer.drain()
+    
+    # Central directory written on close
+    yield buffer.drain()
+
+@app.get("/download")
+async def download_zip(topic: str, format_type: str, files: List[str] = Query(...)):
+    """Stream a ZIP file with the given generated images"""
+    
+    if not topic_slug:
+        raise HTTPException(
+            status_code=500,
+            detail="Listicle generator not available. Check server setup."
+        )
+    
+    if format_type not in ["landscape", "portrait"]:
+        raise HTTPException(status_code=400, detail="Invalid format")
     
-    # Create temp ZIP file
-    temp_dir = tempfile.mkdtemp()
-    zip_filename = f"{topic.replace(' ', '_').lower()}_{format_type}.zip"
-    zip_path = os.path.join(temp_dir, zip_filename)
+    file_paths = []
+    missing_files = []
     
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for image_path in image_paths:
-            if os.path.exists(image_path):
-                # Add file to ZIP with just the filename
-                filename = os.path.basename(image_path)
-                zipf.write(image_path, filename)
+    for filename in files:
+        # Only allow plain filenames from the format's output directory
+        if filename != os.path.basename(filename):
+            raise HTTPException(status_code=400, detail="Invalid filename")
+        
+        file_path = os.path.join(outputs_dir, format_type, filename)
+        if os.path.isfile(file_path):
+            file_paths.append(file_path)
+        else:
+            missing_files.append(filename)
     
-    # Move to outputs directory for serving
-    final_zip_path = os.path.join(outputs_dir, zip_filename)
-    shutil.move(zip_path, final_zip_path)
+    # Old links can outlive their slides (cleanup_old_images); never send a partial ZIP
+    if missing_files:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Files no longer available: {missing_files}"
+        )
     
-    # Clean up temp directory
-    shutil.rmtree(temp_dir)
+    zip_filename = f"{topic_slug(topic)}_{format_type}.zip"
     
-    # Return relative URL
-    return f"/outputs/{zip_filename}"
+    # Same encoding as FileResponse: RFC 5987 for anything not plain ASCII
+    quoted_filename = quote(zip_filename)
+    if quoted_filename != zip_filename:
+        content_disposition = f"attachment; filename*=utf-8''{quoted_filename}"
+    else:
+        content_disposition = f'attachment; filename="{zip_filename}"'
+    
+    return StreamingResponse(
+        iter_zip(file_paths),
+        media_type='application/zip',
+        headers={"Content-Disposition": content_disposition}
+    )
 
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """Download a specific file"""
     
     file_path = os.path.join(outputs_dir, filename)
@@ -203,13 +312,25 @@ async def download_file(filename: str):
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
+    # Validator from mtime and size so unchanged files can answer 304
+    stat_result = os.stat(file_path)
+    etag = f'W/"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": OUTPUT_CACHE_CONTROL}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
     return FileResponse(
         path=file_path,
         filename=filename,
-        media_type='application/octet-stream'
+        media_type='application/octet-stream',
+        headers=headers,
+        stat_result=stat_result
     )
 
 @app.get("/health")
+@cache(expire=5)
 async def health_check():
     """Detailed health check"""
     
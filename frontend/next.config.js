@@ -13,6 +13,10 @@ const nextConfig = {
         source: '/outputs/:path*',
         destination: 'http://localhost:8000/outputs/:path*',
       },
+      {
+        source: '/download',
+        destination: 'http://localhost:8000/download',
+      },
     ]
   },
 }
@@ -3,9 +3,16 @@
 Generate listicle images for social media with flexible size and background options.
 """
 
+import io
 import os
+import re
+import time
+import hashlib
+import functools
 import requests
-import glob
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from diffusers import StableDiffusionPipeline
 import torch
@@ -31,7 +38,139 @@ BACKGROUND_TYPES = {
     'stock': 'Stock images from Unsplash'
 }
 
-def generate_listicle_images(topic, format_type='landscape', background_type='color', num_slides=5):
+# Output image formats and their save options
+IMAGE_FORMATS = {
+    'png': {'format': 'PNG', 'compress_level': 1},
+    'webp': {'format': 'WEBP', 'quality': 90, 'method': 4}
+}
+
+# Text layout per format: font sizes, corner margin and side margin for text
+_FORMAT_TEXT_PARAMS = {
+    'portrait': {
+        'title_size': 75,
+        'subtitle_size': 45,
+        'number_size': 100,
+        'margin': 60,
+        'text_margin': 100
+    },
+    'landscape': {
+        'title_size': 70,
+        'subtitle_size': 42,
+        'number_size': 90,
+        'margin': 80,
+        'text_margin': 150
+    }
+}
+
+FONT_PATH = "/System/Library/Fonts/Helvetica.ttc"
+
+# Leading count in topics like "5 productivity tips"
+_LEADING_DIGITS = re.compile(r'^\d+\s*')
+
+# Content database for different topics
+CONTENT_LIBRARY = {
+    # Productivity
+    "productivity": [
+        {"title": "Time Blocking", "subtitle": "Schedule your day in focused chunks"},
+        {"title": "The 2-Minute Rule", "subtitle": "If it takes less than 2 minutes, do it now"},
+        {"title": "Eliminate Distractions", "subtitle": "Turn off notifications during deep work"},
+        {"title": "Batch Similar Tasks", "subtitle": "Group emails, calls, and admin together"},
+        {"title": "Take Regular Breaks", "subtitle": "Use the Pomodoro Technique for focus"},
+    ],
+    "marketing": [
+        {"title": "Know Your Audience", "subtitle": "Create detailed buyer personas"},
+        {"title": "Content is King", "subtitle": "Provide value before asking for anything"},
+        {"title": "Social Proof Works", "subtitle": "Show testimonials and reviews"},
+        {"title": "Test Everything", "subtitle": "A/B test your headlines and calls-to-action"},
+        {"title": "Follow Up Consistently", "subtitle": "Most sales happen after 5+ touchpoints"},
+    ],
+    "fitness": [
+        {"title": "Start Small", "subtitle": "Begin with 15-minute daily workouts"},
+        {"title": "Consistency Beats Intensity", "subtitle": "Regular exercise is better than sporadic"},
+        {"title": "Track Your Progress", "subtitle": "Use apps or journals to monitor gains"},
+        {"title": "Mix Cardio & Strength", "subtitle": "Combine both for optimal health"},
+        {"title": "Rest is Essential", "subtitle": "Recovery days prevent injury and burnout"},
+    ],
+    "money": [
+        {"title": "Emergency Fund First", "subtitle": "Save 3-6 months of expenses"},
+        {"title": "Automate Your Savings", "subtitle": "Set up automatic transfers to savings"},
+        {"title": "Invest Early & Often", "subtitle": "Time in market beats timing the market"},
+        {"title": "Track Your Spending", "subtitle": "Know where every dollar goes"},
+        {"title": "Increase Your Income", "subtitle": "Focus on skills that pay more"},
+    ],
+    "travel": [
+        {"title": "Book Flights Early", "subtitle": "Save money with advance booking"},
+        {"title": "Pack Light", "subtitle": "One carry-on makes everything easier"},
+        {"title": "Research Local Culture", "subtitle": "Respect customs and traditions"},
+        {"title": "Keep Copies of Documents", "subtitle": "Store digital and physical backups"},
+        {"title": "Stay Connected", "subtitle": "Get local SIM or international plan"},
+    ],
+    "health": [
+        {"title": "Drink More Water", "subtitle": "Aim for 8 glasses daily"},
+        {"title": "Prioritize Sleep", "subtitle": "7-9 hours for optimal health"},
+        {"title": "Eat Whole Foods", "subtitle": "Choose minimally processed options"},
+        {"title": "Move Every Hour", "subtitle": "Combat sedentary lifestyle"},
+        {"title": "Manage Stress", "subtitle": "Practice meditation or deep breathing"},
+    ],
+    "cooking": [
+        {"title": "Prep Ingredients First", "subtitle": "Mise en place makes cooking smoother"},
+        {"title": "Season at Every Step", "subtitle": "Build layers of flavor"},
+        {"title": "Sharp Knives Are Safer", "subtitle": "Keep your knives properly maintained"},
+        {"title": "Taste as You Cook", "subtitle": "Adjust seasoning throughout"},
+        {"title": "Keep It Simple", "subtitle": "Master basics before complex dishes"},
+    ],
+    "learning": [
+        {"title": "Active Recall", "subtitle": "Test yourself instead of re-reading"},
+        {"title": "Spaced Repetition", "subtitle": "Review material at increasing intervals"},
+        {"title": "Teach Others", "subtitle": "Explaining concepts reinforces knowledge"},
+        {"title": "Practice Deliberately", "subtitle": "Focus on weaknesses, not strengths"},
+        {"title": "Take Breaks", "subtitle": "Let your brain process and consolidate"},
+    ],
+}
+
+# Visual themes for different backgrounds
+VISUAL_THEMES = [
+    "modern blue professional",
+    "vibrant energetic orange", 
+    "calm trustworthy green",
+    "elegant sophisticated purple",
+    "warm inviting gold",
+    "cool contemporary teal",
+    "bold confident red",
+    "sleek minimal gray"
+]
+
+# Characters replaced or dropped when a topic is used in filenames
+_TOPIC_SLUG_TABLE = str.maketrans({' ': '_', ',': '', ':': ''})
+
+# Prefixes stripped from topics before matching, e.g. "top 5 fitness tips"
+TOPIC_PREFIXES = ("top ", "best ", "ultimate ", "essential ")
+
+# Shared HTTP session so stock image searches reuse connections
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+# Downloaded stock backgrounds, reused for a day, kept outside the served outputs tree
+STOCK_CACHE_DIR = os.path.expanduser("~/.cache/faceless-video/stock")
+STOCK_CACHE_TTL = 24 * 3600
+STOCK_CACHE_MAX_FILES = 200
+
+# Stable Diffusion pipeline, loaded on first use and shared across requests
+_pipe = None
+
+# Longest edge for diffusion; output is upscaled to the slide size afterwards
+SD_MAX_EDGE = 768
+
+def topic_slug(topic):
+    """Turn a topic into a lowercase, filename-safe slug."""
+    return topic.translate(_TOPIC_SLUG_TABLE).lower()
+
+def generate_listicle_images(topic, format_type='landscape', background_type='color', num_slides=5,
+                             image_format='png'):
     """Generate listicle images with specified format and background type."""
     
     if format_type not in FORMATS:
@@ -40,6 +179,9 @@ def generate_listicle_images(topic, format_type='landscape', background_type='co
     if background_type not in BACKGROUND_TYPES:
         raise ValueError(f"Background type must be one of: {list(BACKGROUND_TYPES.keys())}")
     
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Image format must be one of: {list(IMAGE_FORMATS.keys())}")
+    
     format_config = FORMATS[format_type]
     width, height = format_config['width'], format_config['height']
     
@@ -58,6 +200,14 @@ def generate_listicle_images(topic, format_type='landscape', background_type='co
     # Clean up old images (optional - keeps last 10 images)
     cleanup_old_images(output_dir)
     
+    # AI backgrounds are generated up front in a single batched pipeline call
+    if background_type == 'ai':
+        ai_backgrounds = create_ai_backgrounds(width, height, slides_content)
+    
+    # Timestamp filenames to avoid caching issues (one per generation batch)
+    timestamp = int(time.time())
+    filename_suffix = f"{topic_slug(topic)}_{format_type}_{timestamp}.{image_format}"
+    
     generated_images = []
     
     for i, slide_data in enumerate(slides_content):
@@ -67,22 +217,19 @@ def generate_listicle_images(topic, format_type='landscape', background_type='co
         if background_type == 'color':
             background = create_color_background(width, height, i)
         elif background_type == 'ai':
-            background = create_ai_background(width, height, slide_data)
+            background = ai_backgrounds[i]
         elif background_type == 'stock':
-            background = create_stock_background(width, height, slide_data, topic)
+            background = create_stock_background(width, height, slide_data, topic, i)
         else:
             background = create_color_background(width, height, i)  # fallback
         
         # Add text overlay
         image_with_text = add_text_overlay(background, slide_data, i+1, format_type)
         
-        # Save image with timestamp to avoid caching issues
-        import time
-        timestamp = int(time.time())
-        clean_topic = topic.replace(' ', '_').replace(',', '').replace(':', '').lower()
-        filename = f"slide_{i+1:02d}_{clean_topic}_{format_type}_{timestamp}.png"
+        # Save image
+        filename = f"slide_{i+1:02d}_{filename_suffix}"
         filepath = os.path.join(output_dir, filename)
-        image_with_text.save(filepath)
+        image_with_text.save(filepath, **IMAGE_FORMATS[image_format])
         generated_images.append(filepath)
         
         print(f"Saved: {filepath}")
@@ -105,58 +252,106 @@ def create_color_background(width, height, slide_index):
     
     base_color = colors[slide_index % len(colors)]
     
-    # Create gradient
-    image = Image.new('RGB', (width, height), base_color)
-    draw = ImageDraw.Draw(image)
-    
-    # Create diagonal gradient
-    for i in range(max(width, height)):
-        factor = 1.0 - (i / max(width, height)) * 0.4
-        gradient_color = tuple(int(c * factor) for c in base_color)
-        
-        # Draw diagonal lines for gradient effect
-        if i < width:
-            draw.line([(i, 0), (i, height)], fill=gradient_color)
-        if i < height:
-            draw.line([(0, i), (width, i)], fill=gradient_color)
+    # Create diagonal gradient: each pixel darkens with its larger distance
+    # from the top or left edge
+    rows = np.arange(height)
+    cols = np.arange(width)
+    factor = 1.0 - (np.maximum.outer(rows, cols) / max(width, height)) * 0.4
+    gradient = (np.asarray(base_color, dtype=np.float32) * factor[..., None]).astype(np.uint8)
     
-    return image
+    return Image.fromarray(gradient, 'RGB')
+
+def _get_pipe():
+    """Load the Stable Diffusion pipeline once and reuse it."""
+    global _pipe
+    
+    if _pipe is None:
+        print("Loading Stable Diffusion model...")
+        _pipe = StableDiffusionPipeline.from_pretrained(
+            "runwayml/stable-diffusion-v1-5",
+            torch_dtype=torch.float16,
+            use_safetensors=True,
+            safety_checker=None,
+            requires_safety_checker=False
+        )
+        _pipe = _pipe.to("mps")
+        _pipe.enable_attention_slicing()
+        _pipe.enable_vae_slicing()
+        _pipe.set_progress_bar_config(disable=True)
+    
+    return _pipe
+
+def _sd_size(width, height):
+    """Scale a slide size down to SD_MAX_EDGE, keeping both sides multiples of 8."""
+    scale = SD_MAX_EDGE / max(width, height)
+    return int(width * scale) // 8 * 8, int(height * scale) // 8 * 8
 
-def create_ai_background(width, height, slide_data):
-    """Create AI-generated background using Stable Diffusion."""
+def create_ai_backgrounds(width, height, slides_content):
+    """Create AI-generated backgrounds for all slides in one Stable Diffusion batch."""
     
     try:
-        # Initialize pipeline if not already done
-        if not hasattr(create_ai_background, 'pipe'):
-            print("Loading Stable Diffusion model...")
-            create_ai_background.pipe = StableDiffusionPipeline.from_pretrained(
-                "runwayml/stable-diffusion-v1-5",
-                torch_dtype=torch.float16,
-                use_safetensors=True
-            )
-            create_ai_background.pipe = create_ai_background.pipe.to("mps")
+        pipe = _get_pipe()
         
-        # Create prompt based on slide theme
-        prompt = f"minimalist gradient background, {slide_data['visual_theme']}, professional, clean design, no text, abstract"
+        # Create one prompt per slide based on its theme
+        prompts = [
+            f"minimalist gradient background, {slide_data['visual_theme']}, professional, clean design, no text, abstract"
+            for slide_data in slides_content
+        ]
+        negative_prompt = "text, letters, words, watermark, signature, people, faces, objects"
         
-        # Generate image
-        image = create_ai_background.pipe(
-            prompt=prompt,
-            negative_prompt="text, letters, words, watermark, signature, people, faces, objects",
-            height=height,
-            width=width,
-            guidance_scale=7.5,
-            num_inference_steps=20
-        ).images[0]
+        # Generate all images in a single batched call near SD's native resolution
+        sd_width, sd_height = _sd_size(width, height)
+        with torch.inference_mode():
+            images = pipe(
+                prompt=prompts,
+                negative_prompt=[negative_prompt] * len(prompts),
+                num_images_per_prompt=1,
+                height=sd_height,
+                width=sd_width,
+                guidance_scale=7.5,
+                num_inference_steps=20
+            ).images
         
-        return image
+        # Upscale to the slide size
+        return [image.resize((width, height), Image.LANCZOS) for image in images]
         
     except Exception as e:
         print(f"AI generation failed: {e}")
         print("Falling back to color background...")
-        return create_color_background(width, height, 0)
+        return [create_color_background(width, height, 0) for _ in slides_content]
+
+def _stock_cache_path(search_term, slide_index, width, height):
+    """Path of the cached stock image for a search term, slide and size."""
+    key = hashlib.blake2b(f"{search_term}|{slide_index}|{width}x{height}".encode(), digest_size=16).hexdigest()
+    return os.path.join(STOCK_CACHE_DIR, f"{key}.jpg")
+
+def _is_fresh(path):
+    """Whether a cached file exists and is younger than STOCK_CACHE_TTL."""
+    try:
+        return time.time() - os.path.getmtime(path) < STOCK_CACHE_TTL
+    except OSError:
+        return False
+
+def _prune_stock_cache():
+    """Drop expired stock images and the oldest ones beyond STOCK_CACHE_MAX_FILES."""
+    try:
+        with os.scandir(STOCK_CACHE_DIR) as it:
+            entries = [entry for entry in it if entry.is_file() and entry.name.endswith(".jpg")]
+        
+        # Newest first; everything past the limit or the TTL goes
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        now = time.time()
+        for i, entry in enumerate(entries):
+            if i >= STOCK_CACHE_MAX_FILES or now - entry.stat().st_mtime >= STOCK_CACHE_TTL:
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    print(f"Error removing {entry.path}: {e}")
+                
+    except OSError as e:
+        print(f"Error pruning stock cache: {e}")
 
-def create_stock_background(width, height, slide_data, topic):
+def create_stock_background(width, height, slide_data, topic, slide_index=0):
     """Create background using stock images from Unsplash."""
     
     try:
@@ -176,30 +371,26 @@ def create_stock_background(width, height, slide_data, topic):
         # Try each search term
         for search_term in search_terms:
             try:
+                # Reuse this slide's recent download for the same search
+                cache_path = _stock_cache_path(search_term, slide_index, width, height)
+                if _is_fresh(cache_path):
+                    return _darken(Image.open(cache_path))
+                
                 # Use Unsplash API (no key needed for basic usage)
                 url = f"https://source.unsplash.com/{width}x{height}/?{search_term.replace(' ', ',')}"
                 
-                response = requests.get(url, timeout=10)
+                response = _http.get(url, timeout=10)
                 if response.status_code == 200:
-                    # Save temp image
-                    temp_path = f"../temp/stock_bg_{hash(search_term)}.jpg"
-                    os.makedirs("../temp", exist_ok=True)
-                    
-                    with open(temp_path, 'wb') as f:
-                        f.write(response.content)
+                    # Load image straight from the response
+                    image = Image.open(io.BytesIO(response.content)).convert('RGB')
                     
-                    # Load and process image
-                    image = Image.open(temp_path)
-                    image = image.convert('RGB')
+                    # Cache for later generations
+                    os.makedirs(STOCK_CACHE_DIR, exist_ok=True)
+                    image.save(cache_path, "JPEG", quality=85)
+                    _prune_stock_cache()
                     
-                    # Apply dark overlay for text readability
-                    overlay = Image.new('RGBA', image.size, (0, 0, 0, 100))
-                    image = Image.alpha_composite(image.convert('RGBA'), overlay)
-                    
-                    # Clean up temp file
-                    os.remove(temp_path)
-                    
-                    return image.convert('RGB')
+                    # Darken for text readability
+                    return _darken(image)
                     
             except Exception as e:
                 print(f"Stock image search failed for '{search_term}': {e}")
@@ -218,83 +409,21 @@ def generate_content_for_topic(topic, num_slides):
     
     # Extract the main subject from topic
     clean_topic = topic.lower()
-    for prefix in ["top ", "best ", "ultimate ", "essential "]:
+    for prefix in TOPIC_PREFIXES:
         if clean_topic.startswith(prefix):
             clean_topic = clean_topic.replace(prefix, "", 1)
             break
     
-    import re
-    clean_topic = re.sub(r'^\d+\s*', '', clean_topic)
-    
-    # Content database for different topics
-    content_library = {
-        # Productivity
-        "productivity": [
-            {"title": "Time Blocking", "subtitle": "Schedule your day in focused chunks"},
-            {"title": "The 2-Minute Rule", "subtitle": "If it takes less than 2 minutes, do it now"},
-            {"title": "Eliminate Distractions", "subtitle": "Turn off notifications during deep work"},
-            {"title": "Batch Similar Tasks", "subtitle": "Group emails, calls, and admin together"},
-            {"title": "Take Regular Breaks", "subtitle": "Use the Pomodoro Technique for focus"},
-        ],
-        "marketing": [
-            {"title": "Know Your Audience", "subtitle": "Create detailed buyer personas"},
-            {"title": "Content is King", "subtitle": "Provide value before asking for anything"},
-            {"title": "Social Proof Works", "subtitle": "Show testimonials and reviews"},
-            {"title": "Test Everything", "subtitle": "A/B test your headlines and calls-to-action"},
-            {"title": "Follow Up Consistently", "subtitle": "Most sales happen after 5+ touchpoints"},
-        ],
-        "fitness": [
-            {"title": "Start Small", "subtitle": "Begin with 15-minute daily workouts"},
-            {"title": "Consistency Beats Intensity", "subtitle": "Regular exercise is better than sporadic"},
-            {"title": "Track Your Progress", "subtitle": "Use apps or journals to monitor gains"},
-            {"title": "Mix Cardio & Strength", "subtitle": "Combine both for optimal health"},
-            {"title": "Rest is Essential", "subtitle": "Recovery days prevent injury and burnout"},
-        ],
-        "money": [
-            {"title": "Emergency Fund First", "subtitle": "Save 3-6 months of expenses"},
-            {"title": "Automate Your Savings", "subtitle": "Set up automatic transfers to savings"},
-            {"title": "Invest Early & Often", "subtitle": "Time in market beats timing the market"},
-            {"title": "Track Your Spending", "subtitle": "Know where every dollar goes"},
-            {"title": "Increase Your Income", "subtitle": "Focus on skills that pay more"},
-        ],
-        "travel": [
-            {"title": "Book Flights Early", "subtitle": "Save money with advance booking"},
-            {"title": "Pack Light", "subtitle": "One carry-on makes everything easier"},
-            {"title": "Research Local Culture", "subtitle": "Respect customs and traditions"},
-            {"title": "Keep Copies of Documents", "subtitle": "Store digital and physical backups"},
-            {"title": "Stay Connected", "subtitle": "Get local SIM or international plan"},
-        ],
-        "health": [
-            {"title": "Drink More Water", "subtitle": "Aim for 8 glasses daily"},
-            {"title": "Prioritize Sleep", "subtitle": "7-9 hours for optimal health"},
-            {"title": "Eat Whole Foods", "subtitle": "Choose minimally processed options"},
-            {"title": "Move Every Hour", "subtitle": "Combat sedentary lifestyle"},
-            {"title": "Manage Stress", "subtitle": "Practice meditation or deep breathing"},
-        ],
-        "cooking": [
-            {"title": "Prep Ingredients First", "subtitle": "Mise en place makes cooking smoother"},
-            {"title": "Season at Every Step", "subtitle": "Build layers of flavor"},
-            {"title": "Sharp Knives Are Safer", "subtitle": "Keep your knives properly maintained"},
-            {"title": "Taste as You Cook", "subtitle": "Adjust seasoning throughout"},
-            {"title": "Keep It Simple", "subtitle": "Master basics before complex dishes"},
-        ],
-        "learning": [
-            {"title": "Active Recall", "subtitle": "Test yourself instead of re-reading"},
-            {"title": "Spaced Repetition", "subtitle": "Review material at increasing intervals"},
-            {"title": "Teach Others", "subtitle": "Explaining concepts reinforces knowledge"},
-            {"title": "Practice Deliberately", "subtitle": "Focus on weaknesses, not strengths"},
-            {"title": "Take Breaks", "subtitle": "Let your brain process and consolidate"},
-        ],
-    }
+    clean_topic = _LEADING_DIGITS.sub('', clean_topic)
     
-    # Find matching content based on keywords
-    topic_keywords = clean_topic.split()
-    matched_content = None
-    
-    for key, content in content_library.items():
-        if any(keyword in key for keyword in topic_keywords) or any(keyword in clean_topic for keyword in [key]):
-            matched_content = content
-            break
+    # Find matching content: first library key mentioned in the topic, or one
+    # that a topic word of 3+ letters is a prefix of ("fit" -> "fitness")
+    topic_keywords = [keyword for keyword in clean_topic.split() if len(keyword) >= 3]
+    matched_key = next((
+        key for key in CONTENT_LIBRARY
+        if key in clean_topic or any(key.startswith(keyword) for keyword in topic_keywords)
+    ), None)
+    matched_content = CONTENT_LIBRARY.get(matched_key)
     
     # If no match found, generate generic advice
     if not matched_content:
@@ -309,18 +438,6 @@ def generate_content_for_topic(topic, num_slides):
             {"title": "Get Feedback", "subtitle": f"Ask for input on your {clean_topic} approach"},
         ]
     
-    # Visual themes for different backgrounds
-    themes = [
-        "modern blue professional",
-        "vibrant energetic orange", 
-        "calm trustworthy green",
-        "elegant sophisticated purple",
-        "warm inviting gold",
-        "cool contemporary teal",
-        "bold confident red",
-        "sleek minimal gray"
-    ]
-    
     # Select content for the number of slides requested
     slides = []
     for i in range(num_slides):
@@ -328,46 +445,48 @@ def generate_content_for_topic(topic, num_slides):
         slides.append({
             "title": content_item["title"],
             "subtitle": content_item["subtitle"],
-            "visual_theme": themes[i % len(themes)]
+            "visual_theme": VISUAL_THEMES[i % len(VISUAL_THEMES)]
         })
     
     return slides
 
+@functools.lru_cache(maxsize=32)
+def _get_font(path, size):
+    """Load a TrueType font once per (path, size), falling back to the default font."""
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+def _darken(image, factor=0.61):
+    """Darken an image by a constant factor (same as a black overlay at alpha 100)."""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    arr = np.asarray(image, dtype=np.uint8)
+    scale = int(factor * 256)
+    darkened = (arr.astype(np.uint16) * scale >> 8).astype(np.uint8)
+    return Image.fromarray(darkened, 'RGB')
+
 def add_text_overlay(image, slide_data, slide_number, format_type):
     """Add text overlay optimized for the specified format with better text wrapping."""
     
-    img_with_text = image.copy()
-    draw = ImageDraw.Draw(img_with_text)
-    
-    width, height = img_with_text.size
+    width, height = image.size
     
     # Adjust font sizes and margins based on format
-    if format_type == 'portrait':
-        title_size = 75
-        subtitle_size = 45
-        number_size = 100
-        margin = 60
-        text_margin = 100  # Side margins for text
-    else:
-        title_size = 70
-        subtitle_size = 42
-        number_size = 90
-        margin = 80
-        text_margin = 150  # Side margins for text
-    
-    # Try to load system fonts with bold weight
-    try:
-        title_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", title_size)
-        subtitle_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", subtitle_size)
-        number_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", number_size)
-    except:
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-        number_font = ImageFont.load_default()
-    
-    # Add semi-transparent overlay for better text readability
-    overlay = Image.new('RGBA', image.size, (0, 0, 0, 100))
-    img_with_text = Image.alpha_composite(img_with_text.convert('RGBA'), overlay)
+    text_params = _FORMAT_TEXT_PARAMS.get(format_type, _FORMAT_TEXT_PARAMS['landscape'])
+    title_size = text_params['title_size']
+    subtitle_size = text_params['subtitle_size']
+    number_size = text_params['number_size']
+    margin = text_params['margin']
+    text_margin = text_params['text_margin']  # Side margins for text
+    
+    # Load system fonts (cached per size)
+    title_font = _get_font(FONT_PATH, title_size)
+    subtitle_font = _get_font(FONT_PATH, subtitle_size)
+    number_font = _get_font(FONT_PATH, number_size)
+    
+    # Darken background for better text readability (returns a new RGB image)
+    img_with_text = _darken(image)
     draw = ImageDraw.Draw(img_with_text)
     
     # Add slide number (top left)
@@ -377,19 +496,16 @@ def add_text_overlay(image, slide_data, slide_number, format_type):
     
     # Wrap title text if too long
     max_title_width = width - (text_margin * 2)
-    wrapped_title = wrap_text(slide_data['title'], title_font, max_title_width, draw)
+    title_lines = wrap_text(slide_data['title'], title_font, max_title_width)
     
     # Calculate title position (centered)
-    title_lines = wrapped_title.split('\n')
     title_line_height = title_size + 10
     total_title_height = len(title_lines) * title_line_height
     title_start_y = (height // 2) - (total_title_height // 2) - 30
     
     # Draw title lines
-    for i, line in enumerate(title_lines):
-        line_bbox = draw.textbbox((0, 0), line, font=title_font)
-        line_width = line_bbox[2] - line_bbox[0]
-        line_x = (width - line_width) // 2
+    for i, (line, line_width) in enumerate(title_lines):
+        line_x = int(width - line_width) // 2
         line_y = title_start_y + (i * title_line_height)
         
         draw.text((line_x, line_y), line, font=title_font, fill="white", 
@@ -397,71 +513,77 @@ def add_text_overlay(image, slide_data, slide_number, format_type):
     
     # Wrap subtitle text if too long
     max_subtitle_width = width - (text_margin * 2)
-    wrapped_subtitle = wrap_text(slide_data['subtitle'], subtitle_font, max_subtitle_width, draw)
+    subtitle_lines = wrap_text(slide_data['subtitle'], subtitle_font, max_subtitle_width)
     
     # Calculate subtitle position (below title)
-    subtitle_lines = wrapped_subtitle.split('\n')
     subtitle_line_height = subtitle_size + 8
     subtitle_start_y = title_start_y + total_title_height + 50
     
     # Draw subtitle lines
-    for i, line in enumerate(subtitle_lines):
-        line_bbox = draw.textbbox((0, 0), line, font=subtitle_font)
-        line_width = line_bbox[2] - line_bbox[0]
-        line_x = (width - line_width) // 2
+    for i, (line, line_width) in enumerate(subtitle_lines):
+        line_x = int(width - line_width) // 2
         line_y = subtitle_start_y + (i * subtitle_line_height)
         
         draw.text((line_x, line_y), line, font=subtitle_font, fill="white",
                   stroke_width=2, stroke_fill="black")
     
-    return img_with_text.convert('RGB')
+    return img_with_text
+
+@functools.lru_cache(maxsize=1024)
+def _text_width(font, text):
+    """Measure the advance width of text in font (cached per font and string)."""
+    return font.getlength(text)
 
-def wrap_text(text, font, max_width, draw):
-    """Wrap text to fit within max_width."""
-    words = text.split(' ')
+def wrap_text(text, font, max_width):
+    """Wrap text to fit within max_width, returning (line, pixel_width) pairs."""
+    space_width = _text_width(font, " ")
     lines = []
-    current_line = ""
+    current_words = []
+    current_width = 0
     
-    for word in words:
-        test_line = current_line + (" " if current_line else "") + word
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        text_width = bbox[2] - bbox[0]
+    for word in text.split(' '):
+        word_width = _text_width(font, word)
+        test_width = current_width + space_width + word_width if current_words else word_width
         
-        if text_width <= max_width:
-            current_line = test_line
+        if test_width <= max_width:
+            current_words.append(word)
+            current_width = test_width
         else:
-            if current_line:
-                lines.append(current_line)
-                current_line = word
+            if current_words:
+                lines.append((' '.join(current_words), current_width))
+                current_words = [word]
+                current_width = word_width
             else:
                 # Word is too long, force it
-                lines.append(word)
+                lines.append((word, word_width))
     
-    if current_line:
-        lines.append(current_line)
+    if current_words:
+        lines.append((' '.join(current_words), current_width))
     
-    return '\n'.join(lines)
+    return lines
 
 def cleanup_old_images(output_dir, keep_latest=10):
     """Clean up old generated images, keeping only the most recent ones."""
     try:
-        # Get all PNG files in the directory
-        image_files = glob.glob(os.path.join(output_dir, "*.png"))
+        # Get all generated image files in the directory
+        extensions = tuple(f".{ext}" for ext in IMAGE_FORMATS)
+        with os.scandir(output_dir) as it:
+            image_files = [entry for entry in it if entry.is_file() and entry.name.endswith(extensions)]
         
         if len(image_files) <= keep_latest:
             return
         
         # Sort by modification time (newest first)
-        image_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
+        image_files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
         
         # Remove older files
         files_to_remove = image_files[keep_latest:]
-        for file_path in files_to_remove:
+        for entry in files_to_remove:
             try:
-                os.remove(file_path)
-                print(f"Cleaned up old image: {os.path.basename(file_path)}")
+                os.remove(entry.path)
+                print(f"Cleaned up old image: {entry.name}")
             except OSError as e:
-                print(f"Error removing {file_path}: {e}")
+                print(f"Error removing {entry.path}: {e}")
                 
     except Exception as e:
         print(f"Error during cleanup: {e}")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the slideshow generators.
+"""
+
+import re
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Topic prefixes and leading counts stripped before building slide text
+_PREFIXES = ("top ", "best ", "ultimate ", "essential ")
+_LEAD_NUM = re.compile(r'^\d+\s*')
+
+GRADIENT_THEMES = [
+    "professional blue gradient",
+    "energetic orange gradient",
+    "trustworthy green gradient",
+    "elegant purple gradient",
+    "modern teal gradient",
+    "vibrant red gradient",
+    "sophisticated navy gradient",
+    "warm golden gradient"
+]
+
+# Slide fonts loaded once at import, fall back to default
+try:
+    TITLE_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 80)
+    SUBTITLE_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 50)
+    NUMBER_FONT = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 120)
+except OSError:
+    TITLE_FONT = SUBTITLE_FONT = NUMBER_FONT = ImageFont.load_default()
+
+# Output image formats and their save options; slides are intermediates the
+# video encoder re-compresses, so favour encode speed over file size
+IMAGE_FORMATS = {
+    'png': {'format': 'PNG', 'compress_level': 1, 'optimize': False},
+    'webp': {'format': 'WEBP', 'quality': 90, 'method': 1}
+}
+
+# Base colors for the gradient themes, matched by keyword
+THEME_COLORS = {
+    "blue": (41, 128, 185),
+    "orange": (230, 126, 34),
+    "green": (39, 174, 96),
+    "purple": (142, 68, 173),
+    "teal": (22, 160, 133),
+    "red": (192, 57, 43),
+    "navy": (44, 62, 80),
+    "golden": (241, 196, 15)
+}
+DEFAULT_THEME_COLOR = (52, 73, 94)
+
+def theme_to_rgb(theme):
+    """Pick the base color for a visual theme like 'professional blue gradient'."""
+    for word in theme.lower().split():
+        if word in THEME_COLORS:
+            return THEME_COLORS[word]
+    return DEFAULT_THEME_COLOR
+
+def build_gradient(color, width, height, direction="vertical"):
+    """Render a gradient that darkens by 30% towards the bottom (or right) edge."""
+    length = height if direction == "vertical" else width
+    
+    # One color per row (or column), then broadcast across the image
+    factors = 1.0 - (np.arange(length, dtype=np.float64) / length) * 0.3
+    line = (factors[:, None] * np.asarray(color, dtype=np.float64)).astype(np.uint8)
+    if direction == "vertical":
+        gradient = np.broadcast_to(line[:, None, :], (height, width, 3))
+    else:
+        gradient = np.broadcast_to(line[None, :, :], (height, width, 3))
+    
+    return Image.fromarray(np.ascontiguousarray(gradient), 'RGB')
+
+def generate_content_for_topic(topic, num_slides):
+    """Generate content structure for slideshow slides based on any topic."""
+    
+    # Extract the main subject from topic (remove "top X" or "best" prefixes)
+    clean_topic = topic.lower()
+    for prefix in _PREFIXES:
+        if clean_topic.startswith(prefix):
+            clean_topic = clean_topic[len(prefix):]
+            break
+    clean_topic = _LEAD_NUM.sub('', clean_topic)
+    
+    # Generate generic slides that work for any topic
+    return [
+        {
+            "title": f"Point {i+1}",
+            "subtitle": f"Important aspect of {clean_topic}",
+            "visual_theme": GRADIENT_THEMES[i % len(GRADIENT_THEMES)]
+        }
+        for i in range(num_slides)
+    ]
+
+def add_text_overlay(image, slide_data, slide_number):
+    """Add text overlay to background image."""
+    
+    # Create a copy to modify
+    img_with_text = image.copy()
+    draw = ImageDraw.Draw(img_with_text)
+    
+    # Image dimensions
+    width, height = img_with_text.size
+    
+    # Add slide number (top left)
+    number_text = f"{slide_number}"
+    draw.text((80, 80), number_text, font=NUMBER_FONT, fill="white", stroke_width=3, stroke_fill="black")
+    
+    # Add title (center)
+    title_bbox = draw.textbbox((0, 0), slide_data['title'], font=TITLE_FONT)
+    title_width = title_bbox[2] - title_bbox[0]
+    title_x = (width - title_width) // 2
+    title_y = (height // 2) - 60
+    
+    draw.text((title_x, title_y), slide_data['title'], font=TITLE_FONT, fill="white", 
+              stroke_width=4, stroke_fill="black")
+    
+    # Add subtitle (below title)
+    subtitle_bbox = draw.textbbox((0, 0), slide_data['subtitle'], font=SUBTITLE_FONT)
+    subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
+    subtitle_x = (width - subtitle_width) // 2
+    subtitle_y = title_y + 100
+    
+    draw.text((subtitle_x, subtitle_y), slide_data['subtitle'], font=SUBTITLE_FONT, fill="white",
+              stroke_width=2, stroke_fill="black")
+    
+    return img_with_text
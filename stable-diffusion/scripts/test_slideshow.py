@@ -4,12 +4,16 @@ Test slideshow generation with placeholder images (no SD model download needed).
 """
 
 import os
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import random
+from slideshow_common import IMAGE_FORMATS, add_text_overlay, build_gradient, generate_content_for_topic
 
-def generate_test_slideshow(topic, num_slides=5):
+def generate_test_slideshow(topic, num_slides=5, image_format='png'):
     """Generate test slideshow with colored backgrounds instead of AI images."""
     
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Image format must be one of: {list(IMAGE_FORMATS.keys())}")
+    
     # Generate content for the topic
     slides_content = generate_content_for_topic(topic, num_slides)
     
@@ -45,9 +49,9 @@ def generate_test_slideshow(topic, num_slides=5):
         image_with_text = add_text_overlay(image, slide_data, i+1)
         
         # Save image
-        filename = f"slide_{i+1:02d}_{topic.replace(' ', '_').lower()}.png"
+        filename = f"slide_{i+1:02d}_{topic.replace(' ', '_').lower()}.{image_format}"
         filepath = os.path.join(output_dir, filename)
-        image_with_text.save(filepath)
+        image_with_text.save(filepath, **IMAGE_FORMATS[image_format])
         generated_images.append(filepath)
         
         print(f"Saved: {filepath}")
@@ -58,84 +62,8 @@ def add_gradient_effect(image, base_color):
     """Add a subtle gradient effect to the background."""
     width, height = image.size
     
-    # Create gradient overlay
-    gradient = Image.new('RGB', (width, height), base_color)
-    draw = ImageDraw.Draw(gradient)
-    
-    # Create vertical gradient
-    for y in range(height):
-        # Darken towards bottom
-        factor = 1.0 - (y / height) * 0.3
-        darkened_color = tuple(int(c * factor) for c in base_color)
-        draw.line([(0, y), (width, y)], fill=darkened_color)
-    
-    return gradient
-
-def generate_content_for_topic(topic, num_slides):
-    """Generate content structure for slideshow slides based on any topic."""
-    
-    # Extract the main subject from topic
-    clean_topic = topic.lower()
-    for prefix in ["top ", "best ", "ultimate ", "essential "]:
-        if clean_topic.startswith(prefix):
-            clean_topic = clean_topic.replace(prefix, "", 1)
-            break
-    
-    # Remove numbers like "5", "10" etc.
-    import re
-    clean_topic = re.sub(r'^\d+\s*', '', clean_topic)
-    
-    slides = []
-    for i in range(num_slides):
-        slides.append({
-            "title": f"Point {i+1}",
-            "subtitle": f"Key insight about {clean_topic}",
-            "visual_theme": f"gradient theme {i+1}"
-        })
-    
-    return slides
-
-def add_text_overlay(image, slide_data, slide_number):
-    """Add text overlay to background image."""
-    
-    img_with_text = image.copy()
-    draw = ImageDraw.Draw(img_with_text)
-    
-    width, height = img_with_text.size
-    
-    # Try to load system font, fall back to default
-    try:
-        title_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 80)
-        subtitle_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 50)
-        number_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 120)
-    except:
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-        number_font = ImageFont.load_default()
-    
-    # Add slide number (top left)
-    number_text = f"{slide_number}"
-    draw.text((80, 80), number_text, font=number_font, fill="white", stroke_width=3, stroke_fill="black")
-    
-    # Add title (center)
-    title_bbox = draw.textbbox((0, 0), slide_data['title'], font=title_font)
-    title_width = title_bbox[2] - title_bbox[0]
-    title_x = (width - title_width) // 2
-    title_y = (height // 2) - 60
-    
-    draw.text((title_x, title_y), slide_data['title'], font=title_font, fill="white", 
-              stroke_width=4, stroke_fill="black")
-    
-    # Add subtitle (below title)
-    subtitle_bbox = draw.textbbox((0, 0), slide_data['subtitle'], font=subtitle_font)
-    subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-    subtitle_x = (width - subtitle_width) // 2
-    subtitle_y = title_y + 100
-    
-    draw.text((subtitle_x, subtitle_y), slide_data['subtitle'], font=subtitle_font, fill="white",
-              stroke_width=2, stroke_fill="black")
-    
-    return img_with_text
+    # Vertical gradient, darkening towards bottom
+    return build_gradient(base_color, width, height)
 
 if __name__ == "__main__":
     import sys